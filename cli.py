@@ -6,10 +6,11 @@ Usage: python cli.py input_folder output_folder
 
 import argparse
 import asyncio
+import logging
 import os
 import sys
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from reader import DocumentReader
 from processor import DocumentProcessor
@@ -19,6 +20,8 @@ from logger_config import get_logger
 
 logger = get_logger(__name__)
 
+SUPPORTED_EXT = (".pdf", ".docx", ".txt")
+
 class CLIProcessor:
     """Command-line interface for document processing"""
     
@@ -27,6 +30,8 @@ class CLIProcessor:
         self.processor = DocumentProcessor()
         self.llm_client = LLMClient()
         self.writer = DocumentWriter()
+        # Documents in flight with the LLM while the next ones are being read
+        self.max_concurrent_documents = int(os.getenv("MAX_CONCURRENT_DOCUMENTS", "4"))
     
     async def process_folder(self, input_folder: str, output_folder: str):
         """Process all documents in a folder"""
@@ -40,12 +45,12 @@ class CLIProcessor:
             # Create output directory
             output_path.mkdir(parents=True, exist_ok=True)
             
-            # Find all supported documents
-            supported_extensions = ['.pdf', '.docx', '.txt']
-            documents = []
-            
-            for ext in supported_extensions:
-                documents.extend(input_path.glob(f"*{ext}"))
+            # Find all supported documents in a single directory pass
+            with os.scandir(input_path) as entries:
+                documents = sorted(
+                    Path(entry.path) for entry in entries
+                    if entry.is_file() and entry.name.lower().endswith(SUPPORTED_EXT)
+                )
             
             if not documents:
                 print(f"No supported documents found in {input_folder}")
@@ -53,9 +58,15 @@ class CLIProcessor:
             
             print(f"Found {len(documents)} documents to process")
             
-            # Process each document
-            for doc_path in documents:
-                await self.process_single_document(doc_path, output_path)
+            # Read documents on worker threads while earlier ones are still with the LLM
+            # At most one loaded document waits per consumer, bounding queued memory
+            queue = asyncio.Queue(maxsize=self.max_concurrent_documents)
+            producer = asyncio.create_task(self._read_documents(documents, queue))
+            consumers = [
+                asyncio.create_task(self._process_queued_documents(queue, output_path))
+                for _ in range(self.max_concurrent_documents)
+            ]
+            await asyncio.gather(producer, *consumers)
             
             print("Batch processing completed!")
             
@@ -63,34 +74,74 @@ class CLIProcessor:
             logger.error(f"Batch processing error: {str(e)}")
             raise
     
+    async def _read_documents(self, documents: List[Path], queue: asyncio.Queue):
+        """Producer: read and section documents off the event loop"""
+        try:
+            for doc_path in documents:
+                # Read errors travel with the item so consumers report them in order
+                try:
+                    sections, error = await asyncio.to_thread(self._load_document, doc_path), None
+                except Exception as e:
+                    sections, error = None, e
+                
+                await queue.put((doc_path, sections, error))
+        finally:
+            # One sentinel per consumer so they all shut down
+            for _ in range(self.max_concurrent_documents):
+                await queue.put(None)
+    
+    async def _process_queued_documents(self, queue: asyncio.Queue, output_folder: Path):
+        """Consumer: run queued documents through the LLM and write the outputs"""
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            
+            await self._handle_loaded_document(*item, output_folder)
+    
     async def process_single_document(self, doc_path: Path, output_folder: Path):
         """Process a single document"""
         try:
-            print(f"\nProcessing: {doc_path.name}")
-            
-            # Read document
-            content = self.reader.read_document(str(doc_path), doc_path.name)
-            
-            # Create sections
-            sections = self.processor.create_sections(content)
-            print(f"  Split into {len(sections)} sections")
-            
-            # Process each section
-            plain_english_parts = []
-            summary_parts = []
-            
-            for i, section in enumerate(sections):
-                print(f"  Processing section {i+1}/{len(sections)}")
-                
-                # Plain English conversion
-                plain_prompt = self.processor.create_plain_english_prompt(section)
-                plain_result = await self.llm_client.call_llm_async(plain_prompt)
-                plain_english_parts.append(plain_result)
-                
-                # Summary conversion
-                summary_prompt = self.processor.create_summary_prompt(section)
-                summary_result = await self.llm_client.call_llm_async(summary_prompt)
-                summary_parts.append(summary_result)
+            sections, error = await asyncio.to_thread(self._load_document, doc_path), None
+        except Exception as e:
+            sections, error = None, e
+        
+        await self._handle_loaded_document(doc_path, sections, error, output_folder)
+    
+    def _load_document(self, doc_path: Path) -> List[dict]:
+        """Read a document and split it into sections (runs on a worker thread, so no printing)"""
+        # Read document
+        content = self.reader.read_document(str(doc_path), doc_path.name)
+        
+        # Create sections
+        return self.processor.create_sections(content)
+    
+    async def _handle_loaded_document(
+        self,
+        doc_path: Path,
+        sections: Optional[List[dict]],
+        error: Optional[Exception],
+        output_folder: Path,
+    ):
+        """Report a loaded document on the event loop, then generate its outputs"""
+        print(f"\nProcessing: {doc_path.name}")
+        
+        if error is not None:
+            logger.error(f"Error reading {doc_path.name}: {str(error)}")
+            print(f"  ✗ Error reading {doc_path.name}: {str(error)}")
+            return
+        
+        print(f"  Split into {len(sections)} sections")
+        await self._generate_outputs(doc_path, sections, output_folder)
+    
+    async def _generate_outputs(self, doc_path: Path, sections: List[dict], output_folder: Path):
+        """Convert a document's sections with the LLM and write the output files"""
+        try:
+            # Process all sections concurrently, batching several per LLM call
+            print(f"  Processing {len(sections)} sections from {doc_path.name}")
+            plain_english_parts, summary_parts = await self.processor.generate_outputs(
+                sections, self.llm_client
+            )
             
             # Write output files
             base_name = doc_path.stem
@@ -101,15 +152,8 @@ class CLIProcessor:
             plain_path = output_folder / plain_filename
             summary_path = output_folder / summary_filename
             
-            self.writer.write_docx(
-                "\n\n".join(plain_english_parts),
-                str(plain_path)
-            )
-            
-            self.writer.write_docx(
-                "\n\n".join(summary_parts),
-                str(summary_path)
-            )
+            self.writer.write_docx_iter(plain_english_parts, str(plain_path))
+            self.writer.write_docx_iter(summary_parts, str(summary_path))
             
             print(f"  ✓ Generated: {plain_filename}")
             print(f"  ✓ Generated: {summary_filename}")
@@ -1,10 +1,23 @@
 import os
 import time
+import random
 import asyncio
+import hashlib
 import logging
-from typing import Optional
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Mapping, Tuple
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+from tokenizer import count_tokens
 from logger_config import get_logger
 
 # Load environment variables
@@ -12,6 +25,69 @@ load_dotenv()
 
 logger = get_logger(__name__)
 
+class RateLimiter:
+    """Dual token-bucket limiter for requests per minute and tokens per minute"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._rpm_tokens = requests_per_minute
+        self._tpm_tokens = tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        """Top up both buckets for the time elapsed since the last refill"""
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._rpm_tokens = min(
+            self.requests_per_minute,
+            self._rpm_tokens + self.requests_per_minute * elapsed / 60,
+        )
+        self._tpm_tokens = min(
+            self.tokens_per_minute,
+            self._tpm_tokens + self.tokens_per_minute * elapsed / 60,
+        )
+
+    async def acquire(self, request_cost: float = 1, token_cost: float = 0) -> None:
+        """Wait until both buckets can cover the cost, then consume it"""
+        # A single oversized request must still be able to go through eventually
+        token_cost = min(token_cost, self.tokens_per_minute)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._rpm_tokens >= request_cost and self._tpm_tokens >= token_cost:
+                    self._rpm_tokens -= request_cost
+                    self._tpm_tokens -= token_cost
+                    return
+
+                wait = max(
+                    (request_cost - self._rpm_tokens) * 60 / self.requests_per_minute,
+                    (token_cost - self._tpm_tokens) * 60 / self.tokens_per_minute,
+                )
+                logger.debug("Rate limiter waiting %.2fs", wait)
+                await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Clamp the buckets to the remaining quota reported by the provider"""
+        self._refill()
+
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            try:
+                self._rpm_tokens = min(self._rpm_tokens, float(remaining_requests))
+            except ValueError:
+                pass
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            try:
+                self._tpm_tokens = min(self._tpm_tokens, float(remaining_tokens))
+            except ValueError:
+                pass
+
 class LLMClient:
     """Handles Novita LLM API calls with proper error handling, retry logic, and streaming support"""
 
@@ -21,6 +97,27 @@ class LLMClient:
         self.max_retries = 3
         self.base_delay = 1  # seconds
 
+        # Cap in-flight requests so concurrent fan-out stays under provider limits
+        self.max_concurrency = int(os.getenv("NOVITA_MAX_CONCURRENCY", "8"))
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+
+        # Shape traffic below the account's request and token quotas
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=float(os.getenv("NOVITA_RPM_LIMIT", "600")),
+            tokens_per_minute=float(os.getenv("NOVITA_TPM_LIMIT", "1000000")),
+        )
+
+        # Response cache: bounded in-process LRU backed by sqlite so repeated prompts
+        # (shared boilerplate across documents) skip the API entirely
+        self.cache_ttl = 7 * 24 * 3600  # seconds
+        default_cache_path = "/tmp/.llm_cache.sqlite" if os.environ.get("VERCEL") else ".llm_cache.sqlite"
+        self.cache_path = os.getenv("LLM_CACHE_PATH", default_cache_path)
+        self.cache_size = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (response, created_at)
+        # sqlite I/O runs on worker threads; the lock keeps them off the connection together
+        self._cache_db_lock = threading.Lock()
+        self._cache_db = self._open_cache_db(self.cache_path) if self.cache_path else None
+
         # Novita client setup
         NOVITA_API_KEY = os.getenv("NOVITA_OPENAI_API_KEY")
         NOVITA_BASE_URL = os.getenv("NOVITA_BASE_URL", "https://api.novita.ai/openai")
@@ -28,9 +125,21 @@ class LLMClient:
         if not NOVITA_API_KEY:
             raise ValueError("Missing NOVITA_OPENAI_API_KEY in environment")
 
-        self.client = OpenAI(
+        # One shared pool for every call and retry, sized to the semaphore. With
+        # HTTP/2, concurrent requests multiplex over a single TLS connection.
+        self._http = DefaultAsyncHttpxClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+                keepalive_expiry=60,
+            ),
+        )
+        self.client = AsyncOpenAI(
             base_url=NOVITA_BASE_URL,
             api_key=NOVITA_API_KEY,
+            http_client=self._http,
+            max_retries=0,  # retries are handled (with jitter) by _retry_llm_call
         )
 
     async def call_llm_async(
@@ -39,86 +148,196 @@ class LLMClient:
         model: Optional[str] = None,
         stream: bool = False,
         max_tokens: int = 1000,
+        validate: Optional[Callable[[str], bool]] = None,
     ) -> str:
-        """Async wrapper for LLM API calls"""
-        return await asyncio.to_thread(
-            self.call_llm, prompt, model, stream, max_tokens
-        )
+        """Make a call to the Novita API, bounded by the concurrency semaphore
 
-    def call_llm(
-        self,
-        prompt: str,
-        model: Optional[str] = None,
-        stream: bool = False,
-        max_tokens: int = 1000,
-    ) -> str:
-        """Make a call to the Novita API"""
+        When `validate` is given, only replies it accepts are cached or served
+        from the cache, so a truncated or malformed reply is retried next time.
+        """
         if not model:
             model = self.default_model
 
-        logger.info(f"LLM API call with model: {model}")
-        logger.debug(f"Prompt length: {len(prompt)} characters")
+        cache_key = self._cache_key(prompt, model, max_tokens)
+        cached = await self._cache_get(cache_key)
+        if cached is not None and (validate is None or validate(cached)):
+            logger.info("LLM response served from cache")
+            return cached
 
-        try:
-            response = self._call_novita(prompt, model, stream, max_tokens)
-            logger.info("LLM API call successful")
-            return response
+        logger.info("LLM API call with model: %s", model)
+        logger.debug("Prompt length: %d characters", len(prompt))
+
+        async with self._sem:
+            try:
+                response = await self._call_novita(prompt, model, stream, max_tokens)
+                logger.info("LLM API call successful")
 
-        except Exception as e:
-            logger.error(f"LLM API call failed: {str(e)}")
-            return self._retry_llm_call(prompt, model, stream, max_tokens)
+            except Exception as e:
+                logger.error("LLM API call failed: %s", e)
+                response = await self._retry_llm_call(prompt, model, stream, max_tokens, e)
 
-    def _call_novita(
+        if response and (validate is None or validate(response)):
+            await self._cache_set(cache_key, response)
+        return response
+
+    async def _call_novita(
         self, prompt: str, model: str, stream: bool, max_tokens: int
     ) -> str:
         """Direct Novita API call"""
-        chat_completion_res = self.client.chat.completions.create(
+        await self.rate_limiter.acquire(
+            request_cost=1, token_cost=self.estimate_tokens(prompt) + max_tokens
+        )
+
+        raw_response = await self.client.chat.completions.with_raw_response.create(
             model=model,
             messages=[{"role": "user", "content": prompt}],
             stream=stream,
             max_tokens=max_tokens,
             extra_body={},
         )
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        chat_completion_res = raw_response.parse()
 
         if stream:
-            result = ""
-            for chunk in chat_completion_res:
+            pieces = []
+            async for chunk in chat_completion_res:
                 piece = chunk.choices[0].delta.content or ""
                 print(piece, end="", flush=True)  # live streaming print
-                result += piece
+                pieces.append(piece)
             print()  # newline after streaming
-            return result
+            return "".join(pieces)
         else:
             return chat_completion_res.choices[0].message.content
 
-    def _retry_llm_call(
-        self, prompt: str, model: str, stream: bool, max_tokens: int
+    async def _retry_llm_call(
+        self, prompt: str, model: str, stream: bool, max_tokens: int, error: Exception
     ) -> str:
-        """Retry Novita call with exponential backoff"""
+        """Retry Novita call with jittered exponential backoff, honouring Retry-After on rate limits"""
         for attempt in range(self.max_retries):
             try:
-                delay = self.base_delay * (2 ** attempt)
+                delay = self._retry_delay(error, attempt)
                 logger.info(
-                    f"Retrying LLM call (attempt {attempt + 1}/{self.max_retries}) after {delay}s"
+                    "Retrying LLM call (attempt %d/%d) after %.2fs",
+                    attempt + 1, self.max_retries, delay,
                 )
-                time.sleep(delay)
+                await asyncio.sleep(delay)
 
-                return self._call_novita(prompt, model, stream, max_tokens)
+                return await self._call_novita(prompt, model, stream, max_tokens)
 
             except Exception as e:
-                logger.warning(f"Retry {attempt + 1} failed: {str(e)}")
+                logger.warning("Retry %d failed: %s", attempt + 1, e)
+                error = e
                 if attempt == self.max_retries - 1:
                     raise
 
         raise Exception("Max retries exceeded")
 
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Backoff before the next attempt, with jitter so concurrent callers don't retry in lockstep"""
+        delay = self.base_delay * (2 ** attempt)
+
+        if isinstance(error, RateLimitError):
+            headers = error.response.headers
+            try:
+                if "retry-after-ms" in headers:
+                    delay = float(headers["retry-after-ms"]) / 1000
+                elif "retry-after" in headers:
+                    delay = float(headers["retry-after"])
+            except ValueError:
+                pass  # HTTP-date form; keep the exponential delay
+
+        return delay + random.uniform(0, delay / 2)
+
+    def _open_cache_db(self, path: str) -> Optional[sqlite3.Connection]:
+        """Open the persistent response cache, dropping entries past their TTL"""
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (time.time() - self.cache_ttl,),
+            )
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            logger.warning("Persistent LLM cache disabled (%s): %s", path, e)
+            return None
+
+    def _cache_key(self, prompt: str, model: str, max_tokens: int) -> str:
+        """Exact-match cache key for a prompt and its generation settings"""
+        return hashlib.sha256(f"{model}|{max_tokens}|{prompt}".encode("utf-8")).hexdigest()
+
+    async def _cache_get(self, key: str) -> Optional[str]:
+        """Look up a response in memory, then in the sqlite cache off the event loop"""
+        cutoff = time.time() - self.cache_ttl
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[1] >= cutoff:
+                self._cache.move_to_end(key)
+                return entry[0]
+            del self._cache[key]
+
+        if self._cache_db is None:
+            return None
+
+        row = await asyncio.to_thread(self._cache_db_get, key, cutoff)
+        if row is None:
+            return None
+
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    async def _cache_set(self, key: str, response: str) -> None:
+        """Store a response in memory and in the sqlite cache off the event loop"""
+        created_at = time.time()
+        self._remember(key, response, created_at)
+
+        if self._cache_db is not None:
+            await asyncio.to_thread(self._cache_db_set, key, response, created_at)
+
+    def _cache_db_get(self, key: str, cutoff: float) -> Optional[Tuple[str, float]]:
+        """Blocking sqlite lookup of an unexpired (response, created_at) row"""
+        try:
+            with self._cache_db_lock:
+                return self._cache_db.execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ? AND created_at >= ?",
+                    (key, cutoff),
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+            return None
+
+    def _cache_db_set(self, key: str, response: str, created_at: float) -> None:
+        """Blocking sqlite write of one response"""
+        try:
+            with self._cache_db_lock:
+                self._cache_db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, created_at),
+                )
+                self._cache_db.commit()
+        except sqlite3.Error as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        """Insert into the in-memory LRU tier, evicting the oldest entry when full"""
+        self._cache[key] = (response, created_at)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
     def estimate_tokens(self, text: str) -> int:
-        """Estimate token count for prompt planning"""
-        return len(text) // 4  # Rough approximation
+        """Count prompt tokens with the BPE tokenizer for accurate packing"""
+        return count_tokens(text)
 
-    def check_token_limit(self, prompt: str, model: str = "deepseek/deepseek-r1-distill-llama-8b") -> bool:
-        """Check if prompt exceeds model token limits"""
-        estimated_tokens = self.estimate_tokens(prompt)
+    def check_token_limit(
+        self, prompt: str, model: str = "deepseek/deepseek-r1-distill-llama-8b", output_tokens: int = 0
+    ) -> bool:
+        """Check if prompt plus reserved output tokens exceeds model token limits"""
+        estimated_tokens = self.estimate_tokens(prompt) + output_tokens
 
         limits = {
             "deepseek/deepseek-v3.1": 8192,  # safe default
@@ -7,6 +7,14 @@ import os
 def setup_logging():
     """Configure logging for the application (Vercel-safe)"""
 
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.DEBUG)
+
+    # Already configured (module re-imported or called twice): don't open
+    # another log file or stack duplicate handlers
+    if root_logger.handlers:
+        return root_logger
+
     # Use /tmp for ephemeral logging in serverless
     logs_dir = Path("/tmp/logs")
     logs_dir.mkdir(parents=True, exist_ok=True)
@@ -31,13 +39,8 @@ def setup_logging():
     console_handler.setFormatter(formatter)
 
     # Root logger configuration
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
-
-    # Avoid duplicate handlers if re-imported
-    if not root_logger.handlers:
-        root_logger.addHandler(file_handler)
-        root_logger.addHandler(console_handler)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(console_handler)
 
     return root_logger
 
@@ -2,6 +2,7 @@ from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from typing import List, Optional
+import aiofiles
 import asyncio
 import os
 import uuid
@@ -11,6 +12,7 @@ from reader import DocumentReader
 from processor import DocumentProcessor
 from llm_client import LLMClient
 from writer import DocumentWriter
+from status_store import create_status_store
 from logger_config import get_logger
 
 app = FastAPI(title="Legal Document Processor", version="1.0.0")
@@ -26,9 +28,8 @@ app.add_middleware(
 
 logger = get_logger(__name__)
 
-# In-memory storage for processing status (use Redis/DB in production)
-processing_status = {}
-processed_files = {}
+# Job status and output paths (Redis when REDIS_URL is set, else in-memory)
+status_store = create_status_store()
 
 # Initialize components
 document_reader = DocumentReader()
@@ -39,10 +40,14 @@ document_writer = DocumentWriter()
 # Ensure directories exist
 UPLOAD_DIR = "/tmp/uploads"
 OUTPUT_DIR = "/tmp/outputs"
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# Documents processed at once across all jobs
+document_semaphore = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_DOCUMENTS", "4")))
+
 @app.get("/")
 def read_root():
     return {"Legal Document Processor": "Live"}
@@ -64,10 +69,10 @@ async def upload_documents(
             file_id = str(uuid.uuid4())
             file_path = f"/tmp/uploads/{file_id}_{file.filename}"
             
-            # Save file to disk
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
+            # Stream file to disk in chunks so large uploads never sit fully in memory
+            async with aiofiles.open(file_path, "wb", buffering=0) as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await buffer.write(chunk)
             
             # Prepare file metadata
             metadata = {
@@ -80,13 +85,13 @@ async def upload_documents(
             file_info.append(metadata)
         
         # Initialize processing status
-        processing_status[job_id] = {
+        await status_store.create_job(job_id, {
             "status": "queued",
             "files": [{"filename": f["original_filename"], "status": "queued"} for f in file_info],
             "total_files": len(files),
             "completed_files": 0,
             "started_at": datetime.now().isoformat()
-        }
+        })
         
         # Start background processing
         background_tasks.add_task(process_documents_async, job_id, file_info)
@@ -101,19 +106,19 @@ async def upload_documents(
 @app.get("/status/{job_id}")
 async def get_processing_status(job_id: str):
     """Get processing status for a job"""
-    if job_id not in processing_status:
+    job = await status_store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return processing_status[job_id]
+    return job
 
 @app.get("/download/{file_id}/{file_type}")
 async def download_file(file_id: str, file_type: str):
     """Download processed file"""
-    if file_id not in processed_files:
+    file_paths = await status_store.get_outputs(file_id)
+    if file_paths is None:
         raise HTTPException(status_code=404, detail="File not found")
     
-    file_paths = processed_files[file_id]
-    
     if file_type == "plain":
         file_path = file_paths.get("plain_english")
     elif file_type == "summary":
@@ -133,80 +138,82 @@ async def download_file(file_id: str, file_type: str):
 async def process_documents_async(job_id: str, file_info: List[dict]):
     """Background task to process documents"""
     try:
-        processing_status[job_id]["status"] = "processing"
+        await status_store.update_job(job_id, status="processing")
         logger.info(f"Starting processing for job {job_id}")
         
-        for i, file_data in enumerate(file_info):
-            try:
-                # Update file status
-                processing_status[job_id]["files"][i]["status"] = "processing"
-                
-                # Read document
-                logger.info(f"Reading document: {file_data['original_filename']}")
-                content = document_reader.read_document(
-                    file_data["file_path"], 
-                    file_data["original_filename"]
-                )
-                
-                # Process into sections
-                sections = document_processor.create_sections(content)
-                logger.info(f"Document split into {len(sections)} sections")
-                
-                # Generate both versions
-                plain_english_content = []
-                summary_content = []
-                
-                for section in sections:
-                    # Plain English conversion
-                    plain_prompt = document_processor.create_plain_english_prompt(section)
-                    plain_result = await llm_client.call_llm_async(plain_prompt)
-                    plain_english_content.append(plain_result)
-                    
-                    # Summary conversion
-                    summary_prompt = document_processor.create_summary_prompt(section)
-                    summary_result = await llm_client.call_llm_async(summary_prompt)
-                    summary_content.append(summary_result)
-                
-                # Write output files
-                base_name = os.path.splitext(file_data["original_filename"])[0]
-                
-                plain_path = document_writer.write_docx(
-                    "\n\n".join(plain_english_content),
-                    f"{base_name}_plainEnglish.docx"
-                )
-                
-                summary_path = document_writer.write_docx(
-                    "\n\n".join(summary_content),
-                    f"{base_name}_summary.docx"
-                )
-                
-                # Store file paths for download
-                processed_files[file_data["file_id"]] = {
-                    "plain_english": plain_path,
-                    "summary": summary_path
-                }
-                
-                # Update status
-                processing_status[job_id]["files"][i]["status"] = "completed"
-                processing_status[job_id]["files"][i]["file_id"] = file_data["file_id"]
-                processing_status[job_id]["completed_files"] += 1
-                
-                logger.info(f"Completed processing: {file_data['original_filename']}")
-                
-            except Exception as e:
-                logger.error(f"Error processing {file_data['original_filename']}: {str(e)}")
-                processing_status[job_id]["files"][i]["status"] = "error"
-                processing_status[job_id]["files"][i]["error"] = str(e)
+        # Files run concurrently; LLMClient's semaphore still caps in-flight API calls
+        await asyncio.gather(
+            *(_process_one(job_id, i, file_data) for i, file_data in enumerate(file_info)),
+            return_exceptions=True
+        )
         
         # Mark job as completed
-        processing_status[job_id]["status"] = "completed"
-        processing_status[job_id]["completed_at"] = datetime.now().isoformat()
+        await status_store.update_job(
+            job_id, status="completed", completed_at=datetime.now().isoformat()
+        )
         logger.info(f"Job {job_id} completed")
         
     except Exception as e:
         logger.error(f"Job {job_id} failed: {str(e)}")
-        processing_status[job_id]["status"] = "failed"
-        processing_status[job_id]["error"] = str(e)
+        await status_store.update_job(job_id, status="failed", error=str(e))
+
+async def _process_one(job_id: str, i: int, file_data: dict):
+    """Process a single uploaded file and record its status"""
+    async with document_semaphore:
+        try:
+            # Update file status
+            await status_store.update_file(job_id, i, status="processing")
+            
+            # Read document and split into sections off the event loop
+            sections = await asyncio.to_thread(_read_sections, file_data)
+            
+            # Generate both versions concurrently, batching several sections per LLM call
+            plain_english_content, summary_content = await document_processor.generate_outputs(
+                sections, llm_client
+            )
+            
+            # Write output files
+            base_name = os.path.splitext(file_data["original_filename"])[0]
+            
+            plain_path = await asyncio.to_thread(
+                document_writer.write_docx_iter,
+                plain_english_content,
+                f"{base_name}_plainEnglish.docx"
+            )
+            
+            summary_path = await asyncio.to_thread(
+                document_writer.write_docx_iter,
+                summary_content,
+                f"{base_name}_summary.docx"
+            )
+            
+            # Store file paths for download
+            await status_store.set_outputs(file_data["file_id"], {
+                "plain_english": plain_path,
+                "summary": summary_path
+            })
+            
+            # Update status
+            await status_store.update_file(job_id, i, status="completed", file_id=file_data["file_id"])
+            await status_store.incr_completed(job_id)
+            
+            logger.info(f"Completed processing: {file_data['original_filename']}")
+            
+        except Exception as e:
+            logger.error(f"Error processing {file_data['original_filename']}: {str(e)}")
+            await status_store.update_file(job_id, i, status="error", error=str(e))
+
+def _read_sections(file_data: dict) -> List[dict]:
+    """Read an uploaded document and split it into sections"""
+    logger.info(f"Reading document: {file_data['original_filename']}")
+    content = document_reader.read_document(
+        file_data["file_path"], 
+        file_data["original_filename"]
+    )
+    
+    sections = document_processor.create_sections(content)
+    logger.info(f"Document split into {len(sections)} sections")
+    return sections
 
 @app.get("/")
 async def root():
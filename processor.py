@@ -1,15 +1,77 @@
 import re
-from typing import List, Dict, Any
+import json
+import asyncio
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from tokenizer import count_tokens, get_encoding
 from logger_config import get_logger
 
 logger = get_logger(__name__)
 
+# Paragraph boundary: a blank line, possibly containing whitespace
+_PARA_RE = re.compile(r"\n\s*\n")
+# Output tokens reserved per input token of a batched section: the plain English
+# rewrite runs about as long as the source, plus the summary and JSON escaping
+BATCH_OUTPUT_RATIO = 2
+
+# Sentence boundary inside an oversized paragraph; the whitespace is captured so
+# line breaks (numbered clauses, addresses, signature blocks) survive rejoining
+_SENTENCE_RE = re.compile(r"(?<=[.;:!?])(\s+)")
+
 class DocumentProcessor:
     """Handles document chunking and prompt preparation for LLM processing"""
 
-    def __init__(self, max_section_length: int = 6000):
-        # Bump default limit to allow larger sections
-        self.max_section_length = max_section_length
+    PLAIN_DELIMITER = "===PLAIN==="
+    SUMMARY_DELIMITER = "===SUMMARY==="
+
+    # Prompt skeletons are built once; each call is a single str.format substitution
+    _PLAIN_TMPL = """Convert the following legal text into plain English that anyone can understand. 
+Keep all important information and meaning, but use simple words and clear sentences.
+
+Section: {heading}
+
+Legal Text:
+{text}
+
+Plain English Version:"""
+
+    _SUMMARY_TMPL = """Summarize the following legal text into clear, concise bullet points. 
+Preserve all legal meaning and important details.
+
+Section: {heading}
+
+Legal Text:
+{text}
+
+Bullet-Point Summary:"""
+
+    _COMBINED_TMPL = f"""Rewrite the following legal text in two ways.
+
+First, convert it into plain English that anyone can understand. Keep all important information and meaning, but use simple words and clear sentences.
+Second, summarize it into clear, concise bullet points. Preserve all legal meaning and important details.
+
+Start the plain English version with the line {PLAIN_DELIMITER} and the bullet-point summary with the line {SUMMARY_DELIMITER}.
+
+Section: {{heading}}
+
+Legal Text:
+{{text}}"""
+
+    _BATCHED_TMPL = """You will receive {count} numbered sections of legal text. For each section write:
+- "plain": a plain English version that anyone can understand, keeping all important information and meaning, using simple words and clear sentences
+- "summary": clear, concise bullet points that preserve all legal meaning and important details
+
+Respond with JSON only, with exactly one entry per section in the same order:
+{{"plain": ["...", "..."], "summary": ["...", "..."]}}
+
+Legal Sections:
+{sections}"""
+
+    def __init__(self, max_section_tokens: int = 1500, batch_size: int = 4, max_output_tokens: int = 1000):
+        # Token budget per section (roughly the previous 6000-character limit)
+        self.max_section_tokens = max_section_tokens
+        # Sections packed into one LLM call, and the token budget per generated output
+        self.batch_size = batch_size
+        self.max_output_tokens = max_output_tokens
 
     def create_sections(self, content: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -24,7 +86,7 @@ class DocumentProcessor:
                 return []
 
             # If the document is already within size, keep as one section
-            if len(text) <= self.max_section_length:
+            if count_tokens(text) <= self.max_section_tokens:
                 logger.info("Document fits in a single section")
                 return [{
                     "text": text,
@@ -33,71 +95,249 @@ class DocumentProcessor:
                     "section_number": 0
                 }]
 
-            # Otherwise, chunk by length while preserving paragraph boundaries
-            sections = self._chunk_text(text)
-            logger.info(f"Document split into {len(sections)} large sections")
+            # Otherwise, pack paragraphs up to the token budget
+            sections = self._chunk_by_tokens(text, self.max_section_tokens)
+            logger.info("Document split into %d large sections", len(sections))
             return sections
 
         except Exception as e:
-            logger.error(f"Section creation error: {str(e)}")
+            logger.error("Section creation error: %s", e)
             raise
 
-    def _chunk_text(self, text: str) -> List[Dict[str, Any]]:
-        """Split text into large contiguous chunks instead of micro-sections"""
-        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-        sections, current_text = [], ""
-        section_count = 0
-
-        for para in paragraphs:
-            # If adding the paragraph would exceed max, start a new section
-            if len(current_text) + len(para) > self.max_section_length and current_text:
-                sections.append({
-                    "text": current_text.strip(),
-                    "heading": f"Document Section {section_count+1}",
-                    "number": None,
-                    "section_number": section_count
-                })
-                current_text = para + "\n\n"
-                section_count += 1
-            else:
-                current_text += para + "\n\n"
+    def _chunk_by_tokens(self, text: str, budget: int) -> List[Dict[str, Any]]:
+        """Pack whole paragraphs into sections of at most `budget` tokens"""
+        sections, buf, buf_tokens = [], [], 0
+
+        for para, tokens in self._paragraph_units(text, budget):
+            # If adding the paragraph would exceed the budget, start a new section
+            if buf_tokens + tokens > budget and buf:
+                sections.append(self._make_section("\n\n".join(buf), len(sections)))
+                buf, buf_tokens = [], 0
+
+            buf.append(para)
+            buf_tokens += tokens + 1  # "\n\n" separator is one token
 
         # Add final section
-        if current_text.strip():
-            sections.append({
-                "text": current_text.strip(),
-                "heading": f"Document Section {section_count+1}",
-                "number": None,
-                "section_number": section_count
-            })
+        if buf:
+            sections.append(self._make_section("\n\n".join(buf), len(sections)))
 
         return sections
 
-    def create_plain_english_prompt(self, section: Dict[str, Any]) -> str:
-        heading = section.get("heading", "Document Section")
-        text = section["text"]
-        return f"""Convert the following legal text into plain English that anyone can understand. 
-Keep all important information and meaning, but use simple words and clear sentences.
+    def _paragraph_units(self, text: str, budget: int) -> Iterator[Tuple[str, int]]:
+        """Yield (paragraph, token_count), breaking paragraphs over budget at sentence boundaries"""
+        for para in _PARA_RE.split(text):
+            para = para.strip()
+            if not para:
+                continue
 
-Section: {heading}
+            tokens = count_tokens(para)
+            if tokens <= budget:
+                yield para, tokens
+                continue
 
-Legal Text:
-{text}
+            # split() alternates sentences with the whitespace that followed them
+            parts = _SENTENCE_RE.split(para)
+            buf, buf_tokens = [], 0
+            for i in range(0, len(parts), 2):
+                sentence = parts[i]
+                sentence_tokens = count_tokens(sentence)
+                if buf and buf_tokens + sentence_tokens > budget:
+                    yield "".join(buf), buf_tokens
+                    buf, buf_tokens = [], 0
 
-Plain English Version:"""
+                if sentence_tokens > budget:
+                    yield from self._split_by_tokens(sentence, budget)
+                else:
+                    if buf:
+                        buf.append(parts[i - 1])
+                    buf.append(sentence)
+                    buf_tokens += sentence_tokens + 1
+
+            if buf:
+                yield "".join(buf), buf_tokens
+
+    def _split_by_tokens(self, text: str, budget: int) -> Iterator[Tuple[str, int]]:
+        """Hard-split a single run-on sentence into budget-sized token slices"""
+        encoding = get_encoding()
+        if encoding is None:
+            step = budget * 4  # matches the character heuristic in count_tokens
+            for start in range(0, len(text), step):
+                piece = text[start:start + step]
+                yield piece, count_tokens(piece)
+            return
+
+        # Byte-level BPE can split one multibyte character (§, curly quotes, accents)
+        # across tokens; cut only where the next token starts on a UTF-8 character
+        # boundary, otherwise decoding each slice would leave U+FFFD on both sides
+        token_bytes = [encoding.decode_single_token_bytes(token) for token in encoding.encode_ordinary(text)]
+        n = len(token_bytes)
+
+        def is_boundary(index: int) -> bool:
+            return index >= n or (token_bytes[index][0] & 0xC0) != 0x80
+
+        start = 0
+        while start < n:
+            end = min(start + budget, n)
+            while end > start + 1 and not is_boundary(end):
+                end -= 1
+            while not is_boundary(end):  # a single character wider than the budget
+                end += 1
+
+            yield b"".join(token_bytes[start:end]).decode("utf-8"), end - start
+            start = end
+
+    def _make_section(self, text: str, section_count: int) -> Dict[str, Any]:
+        return {
+            "text": text,
+            "heading": f"Document Section {section_count+1}",
+            "number": None,
+            "section_number": section_count
+        }
+
+    def create_plain_english_prompt(self, section: Dict[str, Any]) -> str:
+        return self._PLAIN_TMPL.format(
+            heading=section.get("heading", "Document Section"),
+            text=section["text"],
+        )
 
     def create_summary_prompt(self, section: Dict[str, Any]) -> str:
-        heading = section.get("heading", "Document Section")
-        text = section["text"]
-        return f"""Summarize the following legal text into clear, concise bullet points. 
-Preserve all legal meaning and important details.
+        return self._SUMMARY_TMPL.format(
+            heading=section.get("heading", "Document Section"),
+            text=section["text"],
+        )
 
-Section: {heading}
+    def create_combined_prompt(self, section: Dict[str, Any]) -> str:
+        return self._COMBINED_TMPL.format(
+            heading=section.get("heading", "Document Section"),
+            text=section["text"],
+        )
 
-Legal Text:
-{text}
+    def parse_combined_response(self, response: str) -> Optional[Tuple[str, str]]:
+        """Split a combined reply into (plain_english, summary); returns None if a delimiter is missing"""
+        before, found, summary = (response or "").partition(self.SUMMARY_DELIMITER)
+        if not found:
+            return None
 
-Bullet-Point Summary:"""
+        _, found, plain = before.partition(self.PLAIN_DELIMITER)
+        if not found:
+            return None
+
+        return plain.strip(), summary.strip()
+
+    def create_batched_prompt(self, sections: List[Dict[str, Any]]) -> str:
+        numbered = "\n\n".join(
+            f"[{i + 1}] Section: {section.get('heading', 'Document Section')}\n{section['text']}"
+            for i, section in enumerate(sections)
+        )
+        return self._BATCHED_TMPL.format(count=len(sections), sections=numbered)
+
+    def parse_batched_response(self, response: str, expected: int) -> Optional[Tuple[List[str], List[str]]]:
+        """Parse a batched JSON reply; returns None if it doesn't match the request"""
+        text = (response or "").strip()
+
+        # Tolerate replies wrapped in a markdown code fence
+        if text.startswith("```"):
+            text = text.split("\n", 1)[-1]
+            text = text.rsplit("```", 1)[0]
+
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+
+        if not isinstance(data, dict):
+            return None
+
+        plain, summary = data.get("plain"), data.get("summary")
+        for parts in (plain, summary):
+            if not isinstance(parts, list) or len(parts) != expected:
+                return None
+            if not all(isinstance(part, str) for part in parts):
+                return None
+
+        return plain, summary
+
+    def batch_output_tokens(self, sections: List[Dict[str, Any]]) -> int:
+        """Output tokens to reserve for a batched reply, capped per section like a single call"""
+        return sum(
+            min(2 * self.max_output_tokens, BATCH_OUTPUT_RATIO * count_tokens(section["text"]))
+            for section in sections
+        )
+
+    def group_sections(self, sections: List[Dict[str, Any]], llm_client) -> List[List[Dict[str, Any]]]:
+        """Pack consecutive sections into batches whose prompt and expected reply fit the model's context"""
+        groups, current = [], []
+
+        for section in sections:
+            candidate = current + [section]
+            fits = llm_client.check_token_limit(
+                self.create_batched_prompt(candidate),
+                llm_client.default_model,
+                output_tokens=self.batch_output_tokens(candidate),
+            )
+            if current and (len(candidate) > self.batch_size or not fits):
+                groups.append(current)
+                current = [section]
+            else:
+                current = candidate
+
+        if current:
+            groups.append(current)
+
+        return groups
+
+    async def generate_outputs(self, sections: List[Dict[str, Any]], llm_client) -> Tuple[List[str], List[str]]:
+        """Run all sections through the LLM concurrently, returning (plain_english, summary) parts in order"""
+        groups = self.group_sections(sections, llm_client)
+        logger.info("Processing %d sections in %d LLM batches", len(sections), len(groups))
+
+        results = await asyncio.gather(
+            *(self._process_group(group, llm_client) for group in groups)
+        )
+
+        plain_english_parts, summary_parts = [], []
+        for plain, summary in results:
+            plain_english_parts.extend(plain)
+            summary_parts.extend(summary)
+
+        return plain_english_parts, summary_parts
+
+    async def _process_group(self, group: List[Dict[str, Any]], llm_client) -> Tuple[List[str], List[str]]:
+        """Process one batch of sections, falling back to per-section prompts if the reply can't be parsed"""
+        if len(group) > 1:
+            response = await llm_client.call_llm_async(
+                self.create_batched_prompt(group),
+                max_tokens=self.batch_output_tokens(group),
+                validate=lambda reply: self.parse_batched_response(reply, len(group)) is not None,
+            )
+            parsed = self.parse_batched_response(response, len(group))
+            if parsed is not None:
+                return parsed
+
+            logger.warning("Could not parse batched response for %d sections, falling back to single prompts", len(group))
+
+        results = await asyncio.gather(
+            *(self._process_section(section, llm_client) for section in group)
+        )
+        return [plain for plain, _ in results], [summary for _, summary in results]
+
+    async def _process_section(self, section: Dict[str, Any], llm_client) -> Tuple[str, str]:
+        """Generate the plain English and summary versions of a single section in one call"""
+        response = await llm_client.call_llm_async(
+            self.create_combined_prompt(section),
+            max_tokens=2 * self.max_output_tokens,
+            validate=lambda reply: self.parse_combined_response(reply) is not None,
+        )
+        parsed = self.parse_combined_response(response)
+        if parsed is not None:
+            return parsed
+
+        logger.warning("Combined response missing delimiters for %s, using separate prompts", section.get("heading"))
+        plain, summary = await asyncio.gather(
+            llm_client.call_llm_async(self.create_plain_english_prompt(section), max_tokens=self.max_output_tokens),
+            llm_client.call_llm_async(self.create_summary_prompt(section), max_tokens=self.max_output_tokens),
+        )
+        return plain, summary
 
     def validate_output(self, original_sections: List[Dict], processed_output: str) -> Dict[str, Any]:
         validation_result = {
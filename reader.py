@@ -1,31 +1,198 @@
+import io
 import os
+import copy
+import hashlib
 import logging
-from typing import Dict, Any
+import functools
+import importlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
 try:
-    import pdfplumber
-    import PyPDF2
-    import fitz  # PyMuPDF
+    import charset_normalizer
 except ImportError:
-    pdfplumber = None
-    PyPDF2 = None
-    fitz = None
-
-try:
-    from docx import Document
-except ImportError:
-    Document = None
+    charset_normalizer = None
 
 from logger_config import get_logger
 
 logger = get_logger(__name__)
 
+
+@functools.lru_cache(maxsize=None)
+def _import_optional(module_name: str):
+    """Import a heavy parsing backend on first use; None if it isn't installed
+
+    Deferring these keeps cold starts fast for requests that never touch PDFs.
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
+
+
+def _get_fitz():
+    return _import_optional("fitz")  # PyMuPDF
+
+
+def _get_pdfplumber():
+    return _import_optional("pdfplumber")
+
+
+def _get_pypdf2():
+    return _import_optional("PyPDF2")
+
+
+def _get_docx():
+    return _import_optional("docx")  # python-docx
+
+
+# Read text files with one large buffer instead of many 8 KiB reads
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Bytes sniffed on each side of the first non-UTF-8 byte when guessing a text file's encoding
+ENCODING_SNIFF_RADIUS = 2048
+
+# PDFs above this size skip pdfplumber, whose per-page cost grows fastest on heavy pages
+LARGE_PDF_BYTES = 5 * 1024 * 1024
+
+# Below this many pages, process start-up costs more than parallel extraction saves
+MIN_PAGES_FOR_POOL = 32
+
+# PyMuPDF is not thread-safe, and the API reads documents on worker threads;
+# every in-process fitz call goes through this lock
+_FITZ_LOCK = threading.Lock()
+
+# OpenSSL's SHA-256 uses the CPU's SHA extensions where available; the builtin fallback doesn't
+_SHA256_BACKEND = "OpenSSL" if hashlib.sha256.__name__.startswith("openssl_") else "builtin"
+logger.debug(f"Document cache hashing with {_SHA256_BACKEND} SHA-256")
+
+
+# WordprocessingML element names for walking DOCX XML directly
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P = f"{_W_NS}p"
+_W_R = f"{_W_NS}r"
+_W_HYPERLINK = f"{_W_NS}hyperlink"
+_W_T = f"{_W_NS}t"
+_W_BR = f"{_W_NS}br"
+_W_CR = f"{_W_NS}cr"
+_W_TYPE = f"{_W_NS}type"
+_W_VAL = f"{_W_NS}val"
+_W_PSTYLE_PATH = f"{_W_NS}pPr/{_W_NS}pStyle"
+
+# Fixed text equivalents of run children, as in python-docx's Run.text
+_W_RUN_CHARS = {
+    f"{_W_NS}tab": "\t",
+    f"{_W_NS}ptab": "\t",
+    f"{_W_NS}noBreakHyphen": "-",
+    _W_CR: "\n",
+}
+
+
+# Word's built-in heading styles (display names); membership is one hash lookup
+_HEADING_STYLES = frozenset([f"Heading {level}" for level in range(1, 10)] + ["Title"])
+
+
+def _docx_fast_paragraphs(doc):
+    """Yield (text, style_name) for each body paragraph via raw lxml traversal
+
+    Skips python-docx's per-paragraph Paragraph/Run/Style wrappers but reads
+    the same elements as Paragraph.text: only runs directly under the
+    paragraph or a hyperlink, so text boxes, fallback copies of alternate
+    content, fields, content controls and tracked insertions are left out.
+    Style IDs are mapped to display names once per document.
+    """
+    style_names = {style.style_id: style.name for style in doc.styles}
+    
+    # Paragraphs without a pStyle use the document's default paragraph style
+    paragraph_type = _import_optional("docx.enum.style").WD_STYLE_TYPE.PARAGRAPH
+    default_style = doc.styles.default(paragraph_type)
+    default_name = default_style.name if default_style is not None else ""
+    
+    for p in doc.element.body.iterchildren(_W_P):
+        pieces = []
+        for child in p.iterchildren(_W_R, _W_HYPERLINK):
+            runs = (child,) if child.tag == _W_R else child.iterchildren(_W_R)
+            for run in runs:
+                for node in run.iterchildren():
+                    tag = node.tag
+                    if tag == _W_T:
+                        pieces.append(node.text or "")
+                    elif tag == _W_BR:
+                        if node.get(_W_TYPE) in (None, "textWrapping"):
+                            pieces.append("\n")
+                    else:
+                        char = _W_RUN_CHARS.get(tag)
+                        if char is not None:
+                            pieces.append(char)
+        
+        style = p.find(_W_PSTYLE_PATH)
+        if style is None:
+            yield "".join(pieces), default_name
+        else:
+            yield "".join(pieces), style_names.get(style.get(_W_VAL), default_name)
+
+
+def _file_hash(file_path: str) -> bytes:
+    """Raw SHA-256 digest of a file, streamed in 1 MiB unbuffered reads"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb', buffering=0) as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _extract_pdf_range(args: Tuple[str, int, int, bool]) -> Tuple[int, List[str]]:
+    """Pool worker: extract text for pages [start, end) of a PDF with PyMuPDF
+
+    Each worker opens its own fitz.Document since documents can't be pickled
+    across processes. Also used in-process, hence the lock.
+    """
+    file_path, start, end, sort = args
+    fitz = _get_fitz()
+    # Plain text only: skip ligature preservation and other glyph-mapping extras
+    flags = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_MEDIABOX_CLIP
+    with _FITZ_LOCK:
+        doc = fitz.open(file_path)
+        try:
+            return start, [
+                doc.load_page(page_num).get_text("text", flags=flags, sort=sort)
+                for page_num in range(start, end)
+            ]
+        finally:
+            doc.close()
+
+
+def _write_part(buf: io.StringIO, *pieces: str) -> None:
+    """Append one text part to buf, separated from any previous part by a blank line"""
+    if buf.tell():
+        buf.write("\n\n")
+    for piece in pieces:
+        buf.write(piece)
+
+
 class DocumentReader:
     """Handles reading various document formats and extracting structured text"""
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 32, prefer_structured: bool = False, sort_pdf_text: bool = False):
         self.supported_formats = [".pdf", ".docx", ".txt"]
+        # LRU of (content hash, extension) -> parsed content, so re-uploads skip parsing
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # PDF backend by page count: first rule whose limit covers the document wins.
+        # PyMuPDF is the default; table-heavy callers can opt into pdfplumber's
+        # richer layout analysis for small documents.
+        self._parser_rules = [
+            (500, "fitz_batch"),
+            (float("inf"), "fitz_mp"),
+        ]
+        if prefer_structured:
+            self._parser_rules.insert(0, (10, "plumber_batch"))
+        # PyMuPDF returns text in content-stream order unless asked to sort by position
+        self.sort_pdf_text = sort_pdf_text
         
     def read_document(self, file_path: str, filename: str) -> Dict[str, Any]:
         """
@@ -46,64 +213,56 @@ class DocumentReader:
             
             logger.info(f"Reading document: {filename} ({file_extension})")
             
+            cache_key = (_file_hash(file_path), file_extension)
+            with self._cache_lock:
+                cached = self._cache.get(cache_key)
+                if cached is not None:
+                    self._cache.move_to_end(cache_key)
+            if cached is not None:
+                logger.info(f"Using cached parse for {filename}")
+                return copy.deepcopy(cached)
+            
             if file_extension == ".pdf":
-                return self._read_pdf(file_path)
+                content = self._read_pdf(file_path)
             elif file_extension == ".docx":
-                return self._read_docx(file_path)
+                content = self._read_docx(file_path)
             elif file_extension == ".txt":
-                return self._read_txt(file_path)
+                content = self._read_txt(file_path)
             else:
                 raise ValueError(f"No reader available for {file_extension}")
+            
+            with self._cache_lock:
+                self._cache[cache_key] = copy.deepcopy(content)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            
+            return content
                 
         except Exception as e:
             logger.error(f"Error reading document {filename}: {str(e)}")
             raise
     
     def _read_pdf(self, file_path: str) -> Dict[str, Any]:
-        """Extract text from PDF using multiple libraries for best results"""
+        """Extract text from PDF, picking the backend by page count and file size"""
         content = {"text": "", "sections": [], "metadata": {}}
         
         try:
-            # Try pdfplumber first (best for structured text)
-            if pdfplumber:
-                with pdfplumber.open(file_path) as pdf:
-                    text_parts = []
-                    for page_num, page in enumerate(pdf.pages):
-                        page_text = page.extract_text()
-                        if page_text:
-                            text_parts.append(f"[Page {page_num + 1}]\n{page_text}")
-                    
-                    content["text"] = "\n\n".join(text_parts)
-                    content["metadata"]["pages"] = len(pdf.pages)
-                    
-            # Fallback to PyMuPDF if pdfplumber fails
-            elif fitz:
-                doc = fitz.open(file_path)
-                text_parts = []
-                for page_num in range(len(doc)):
-                    page = doc.load_page(page_num)
-                    page_text = page.get_text()
-                    if page_text.strip():
-                        text_parts.append(f"[Page {page_num + 1}]\n{page_text}")
-                
-                content["text"] = "\n\n".join(text_parts)
-                content["metadata"]["pages"] = len(doc)
-                doc.close()
-                
-            # Final fallback to PyPDF2
-            elif PyPDF2:
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    text_parts = []
-                    for page_num, page in enumerate(pdf_reader.pages):
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_parts.append(f"[Page {page_num + 1}]\n{page_text}")
-                    
-                    content["text"] = "\n\n".join(text_parts)
-                    content["metadata"]["pages"] = len(pdf_reader.pages)
-            else:
-                raise ImportError("No PDF reading library available")
+            file_size = os.path.getsize(file_path)
+            page_count = self._probe_page_count(file_path)
+            parser = self._select_pdf_parser(page_count, file_size)
+            
+            extractors = {
+                "plumber_batch": self._read_pdf_plumber,
+                "fitz_batch": self._read_pdf_fitz,
+                "fitz_mp": self._read_pdf_fitz_parallel,
+                "pypdf2": self._read_pdf_pypdf2,
+            }
+            text, metadata = extractors[parser](file_path, page_count)
+            
+            content["text"] = text
+            content["metadata"].update(metadata)
+            content["metadata"]["parser"] = parser
+            logger.debug(f"PDF parsed with {parser} ({content['metadata'].get('pages')} pages)")
                 
         except Exception as e:
             logger.error(f"PDF reading error: {str(e)}")
@@ -111,34 +270,146 @@ class DocumentReader:
         
         return content
     
+    def _probe_page_count(self, file_path: str) -> Optional[int]:
+        """Cheap page count from the PDF header via PyMuPDF, if available"""
+        fitz = _get_fitz()
+        if not fitz:
+            return None
+        
+        with _FITZ_LOCK:
+            doc = fitz.open(file_path)
+            try:
+                return len(doc)
+            finally:
+                doc.close()
+    
+    def _select_pdf_parser(self, page_count: Optional[int], file_size: int = 0) -> str:
+        """Choose a backend from the page-count rule table, file size and installed libraries"""
+        if page_count is not None:
+            for max_pages, parser in self._parser_rules:
+                if page_count <= max_pages:
+                    # pdfplumber gives the best structure on small documents, if
+                    # installed and the file isn't large enough to make it crawl
+                    if parser == "plumber_batch" and (
+                        file_size > LARGE_PDF_BYTES or not _get_pdfplumber()
+                    ):
+                        return "fitz_batch"
+                    return parser
+        
+        if _get_pdfplumber():
+            return "plumber_batch"
+        if _get_pypdf2():
+            return "pypdf2"
+        raise ImportError("No PDF reading library available")
+    
+    def _read_pdf_plumber(self, file_path: str, page_count: Optional[int]) -> Tuple[str, Dict[str, Any]]:
+        """pdfplumber: slowest, but best for structured text and tables"""
+        with _get_pdfplumber().open(file_path) as pdf:
+            buf = io.StringIO()
+            # Count pages during the single pass instead of resolving pdf.pages again
+            pages = 0
+            for pages, page in enumerate(pdf.pages, 1):
+                page_text = page.extract_text()
+                if page_text:
+                    _write_part(buf, f"[Page {pages}]\n", page_text)
+            
+            return buf.getvalue(), {"pages": pages}
+    
+    def _read_pdf_fitz(self, file_path: str, page_count: int) -> Tuple[str, Dict[str, Any]]:
+        """PyMuPDF in this process"""
+        page_texts = _extract_pdf_range((file_path, 0, page_count, self.sort_pdf_text))[1]
+        return self._join_pages(page_texts), {"pages": page_count}
+    
+    def _read_pdf_fitz_parallel(self, file_path: str, page_count: int) -> Tuple[str, Dict[str, Any]]:
+        """PyMuPDF with page ranges split across a process pool"""
+        page_texts = self._extract_pdf_pages(file_path, page_count)
+        return self._join_pages(page_texts), {"pages": page_count}
+    
+    def _read_pdf_pypdf2(self, file_path: str, page_count: Optional[int]) -> Tuple[str, Dict[str, Any]]:
+        """PyPDF2: last-resort pure-Python fallback"""
+        with open(file_path, 'rb') as file:
+            pdf_reader = _get_pypdf2().PdfReader(file)
+            buf = io.StringIO()
+            pages = 0
+            for pages, page in enumerate(pdf_reader.pages, 1):
+                page_text = page.extract_text()
+                if page_text.strip():
+                    _write_part(buf, f"[Page {pages}]\n", page_text)
+            
+            return buf.getvalue(), {"pages": pages}
+    
+    def _extract_pdf_pages(self, file_path: str, page_count: int) -> List[str]:
+        """Extract page texts with PyMuPDF, splitting large documents across processes"""
+        workers = min(multiprocessing.cpu_count(), page_count // MIN_PAGES_FOR_POOL)
+        
+        if workers > 1:
+            segment = -(-page_count // workers)  # ceiling division
+            ranges = [
+                (file_path, start, min(start + segment, page_count), self.sort_pdf_text)
+                for start in range(0, page_count, segment)
+            ]
+            try:
+                # spawn, not fork: forking this multithreaded process could copy
+                # a lock held by another thread into the children
+                with multiprocessing.get_context("spawn").Pool(workers) as pool:
+                    results = pool.map(_extract_pdf_range, ranges)
+                
+                # map() preserves range order, so pages concatenate in sequence
+                page_texts = []
+                for _, texts in results:
+                    page_texts.extend(texts)
+                return page_texts
+            
+            except OSError as e:
+                # Some serverless runtimes lack the shared memory multiprocessing needs
+                logger.warning(f"Parallel PDF extraction unavailable, reading serially: {str(e)}")
+        
+        return _extract_pdf_range((file_path, 0, page_count, self.sort_pdf_text))[1]
+    
+    def _join_pages(self, page_texts: List[str]) -> str:
+        """Join non-empty page texts with [Page N] markers"""
+        buf = io.StringIO()
+        for page_num, page_text in enumerate(page_texts):
+            if page_text.strip():
+                _write_part(buf, f"[Page {page_num + 1}]\n", page_text)
+        
+        return buf.getvalue()
+    
     def _read_docx(self, file_path: str) -> Dict[str, Any]:
         """Extract text from DOCX maintaining structure"""
         content = {"text": "", "sections": [], "metadata": {}}
         
         try:
-            if not Document:
+            docx = _get_docx()
+            if not docx:
                 raise ImportError("python-docx not available")
                 
-            doc = Document(file_path)
-            text_parts = []
+            doc = docx.Document(file_path)
+            buf = io.StringIO()
             sections = []
             
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    # Check if paragraph is a heading
-                    if paragraph.style.name.startswith('Heading'):
-                        sections.append({
-                            "type": "heading",
-                            "level": paragraph.style.name,
-                            "text": paragraph.text.strip()
-                        })
-                        text_parts.append(f"\n## {paragraph.text.strip()}\n")
-                    else:
-                        text_parts.append(paragraph.text.strip())
+            # Walk the XML once for text and style; count as we go
+            n_para = 0
+            for raw_text, style_name in _docx_fast_paragraphs(doc):
+                n_para += 1
+                text = raw_text.strip()
+                if not text:
+                    continue
+                
+                # Check if paragraph is a heading
+                if style_name in _HEADING_STYLES:
+                    sections.append({
+                        "type": "heading",
+                        "level": style_name,
+                        "text": text
+                    })
+                    _write_part(buf, "\n## ", text, "\n")
+                else:
+                    _write_part(buf, text)
             
-            content["text"] = "\n\n".join(text_parts)
+            content["text"] = buf.getvalue()
             content["sections"] = sections
-            content["metadata"]["paragraphs"] = len(doc.paragraphs)
+            content["metadata"]["paragraphs"] = n_para
             
         except Exception as e:
             logger.error(f"DOCX reading error: {str(e)}")
@@ -147,30 +418,44 @@ class DocumentReader:
         return content
     
     def _read_txt(self, file_path: str) -> Dict[str, Any]:
-        """Read plain text file"""
+        """Read plain text file, detecting the encoding if it isn't UTF-8"""
         content = {"text": "", "sections": [], "metadata": {}}
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                content["text"] = text
-                content["metadata"]["characters"] = len(text)
-                content["metadata"]["lines"] = len(text.splitlines())
-                
-        except UnicodeDecodeError:
-            # Try different encoding
+            # Read the bytes once; decoding retries work from memory
+            with open(file_path, 'rb', buffering=READ_BUFFER_SIZE) as file:
+                raw = file.read()
+            
             try:
-                with open(file_path, 'r', encoding='latin-1') as file:
-                    text = file.read()
-                    content["text"] = text
-                    content["metadata"]["characters"] = len(text)
-                    content["metadata"]["lines"] = len(text.splitlines())
-                    content["metadata"]["encoding"] = "latin-1"
-            except Exception as e:
-                logger.error(f"Text reading error: {str(e)}")
-                raise
+                text = raw.decode('utf-8')
+            except UnicodeDecodeError as e:
+                encoding = self._detect_encoding(raw, e.start)
+                text = raw.decode(encoding, errors='replace')
+                content["metadata"]["encoding"] = encoding
+            
+            # Match text-mode universal newlines
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            
+            content["text"] = text
+            content["metadata"]["characters"] = len(text)
+            content["metadata"]["lines"] = len(text.splitlines())
+            
         except Exception as e:
             logger.error(f"Text reading error: {str(e)}")
             raise
             
-        return content
\ No newline at end of file
+        return content
+    
+    def _detect_encoding(self, raw: bytes, bad_offset: int) -> str:
+        """Best-guess encoding for bytes that aren't valid UTF-8, defaulting to latin-1"""
+        if charset_normalizer is None:
+            return "latin-1"
+        
+        # Detection cost grows with input size, so sniff a fixed window around the
+        # first byte that broke UTF-8; a leading ASCII-only header can't mislead it
+        window = raw[max(0, bad_offset - ENCODING_SNIFF_RADIUS):bad_offset + ENCODING_SNIFF_RADIUS]
+        encoding = charset_normalizer.detect(window)["encoding"]
+        if not encoding or encoding.lower().replace("-", "_") in ("ascii", "utf_8"):
+            return "latin-1"
+        return encoding
\ No newline at end of file
@@ -0,0 +1,158 @@
+import os
+import json
+import copy
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class StatusStore(ABC):
+    """Storage for job progress and processed output paths"""
+
+    @abstractmethod
+    async def create_job(self, job_id: str, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_file(self, job_id: str, index: int, **fields: Any) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def incr_completed(self, job_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_outputs(self, file_id: str, outputs: Dict[str, str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_outputs(self, file_id: str) -> Optional[Dict[str, str]]:
+        raise NotImplementedError
+
+
+class InMemoryStatusStore(StatusStore):
+    """Process-local store; state is lost on restart and not shared between workers"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.outputs: Dict[str, Dict[str, str]] = {}
+
+    async def create_job(self, job_id: str, job: Dict[str, Any]) -> None:
+        self.jobs[job_id] = copy.deepcopy(job)
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        self.jobs[job_id].update(fields)
+
+    async def update_file(self, job_id: str, index: int, **fields: Any) -> None:
+        self.jobs[job_id]["files"][index].update(fields)
+
+    async def incr_completed(self, job_id: str) -> None:
+        self.jobs[job_id]["completed_files"] += 1
+
+    async def set_outputs(self, file_id: str, outputs: Dict[str, str]) -> None:
+        self.outputs[file_id] = dict(outputs)
+
+    async def get_outputs(self, file_id: str) -> Optional[Dict[str, str]]:
+        return self.outputs.get(file_id)
+
+
+class RedisStatusStore(StatusStore):
+    """Redis-backed store shared by all workers and persistent across restarts
+
+    Each job is a hash ``job:{id}`` whose values are JSON-encoded; per-file
+    entries live in their own ``file:{index}`` fields so concurrent file
+    updates never overwrite each other, and ``completed_files`` is bumped
+    atomically with HINCRBY.
+    """
+
+    def __init__(self, client, ttl: int = 24 * 3600):
+        self.client = client
+        self.ttl = ttl
+
+    async def create_job(self, job_id: str, job: Dict[str, Any]) -> None:
+        key = f"job:{job_id}"
+        mapping = {name: json.dumps(value) for name, value in job.items() if name != "files"}
+        for index, file_status in enumerate(job.get("files", [])):
+            mapping[f"file:{index}"] = json.dumps(file_status)
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.hgetall(f"job:{job_id}")
+        if not raw:
+            return None
+
+        job, files = {}, {}
+        for name, value in raw.items():
+            if name.startswith("file:"):
+                files[int(name.split(":", 1)[1])] = json.loads(value)
+            else:
+                job[name] = json.loads(value)
+
+        job["files"] = [files[index] for index in sorted(files)]
+        return job
+
+    async def update_job(self, job_id: str, **fields: Any) -> None:
+        await self.client.hset(
+            f"job:{job_id}",
+            mapping={name: json.dumps(value) for name, value in fields.items()},
+        )
+
+    async def update_file(self, job_id: str, index: int, **fields: Any) -> None:
+        key, field = f"job:{job_id}", f"file:{index}"
+        file_status = json.loads(await self.client.hget(key, field) or "{}")
+        file_status.update(fields)
+        await self.client.hset(key, field, json.dumps(file_status))
+
+    async def incr_completed(self, job_id: str) -> None:
+        await self.client.hincrby(f"job:{job_id}", "completed_files", 1)
+
+    async def set_outputs(self, file_id: str, outputs: Dict[str, str]) -> None:
+        key = f"outputs:{file_id}"
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=outputs)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def get_outputs(self, file_id: str) -> Optional[Dict[str, str]]:
+        outputs = await self.client.hgetall(f"outputs:{file_id}")
+        return outputs or None
+
+
+def create_status_store() -> StatusStore:
+    """Use Redis when REDIS_URL is configured, otherwise fall back to process memory"""
+    redis_url = os.getenv("REDIS_URL")
+
+    if not redis_url:
+        logger.info("REDIS_URL not set, using in-memory status store")
+        return InMemoryStatusStore()
+
+    if redis is None:
+        logger.warning("REDIS_URL is set but the redis package is not installed, using in-memory status store")
+        return InMemoryStatusStore()
+
+    ttl = int(os.getenv("REDIS_JOB_TTL", str(24 * 3600)))
+    logger.info("Using Redis status store")
+    return RedisStatusStore(redis.from_url(redis_url, decode_responses=True), ttl=ttl)
@@ -0,0 +1,53 @@
+import pytest
+
+docx = pytest.importorskip("docx")
+
+from writer import DocumentWriter
+
+CONTENT = """# Lease Agreement
+
+The tenant pays rent monthly.
+Rent is due on the first day.
+
+## Obligations
+• Keep the premises clean
+- Report damage promptly
+
+### Termination
+Either party may end the lease with notice."""
+
+
+@pytest.fixture
+def writer(tmp_path):
+    document_writer = DocumentWriter()
+    document_writer.output_dir = str(tmp_path)
+    return document_writer
+
+
+def paragraphs(doc):
+    return [(p.text, p.style.name) for p in doc.paragraphs]
+
+
+def test_template_matches_fresh_document(writer):
+    """Output built on the pre-built skeleton equals the Document() + add_heading path"""
+    path = writer.write_docx(CONTENT, "templated.docx")
+
+    expected = docx.Document()
+    expected.add_heading("Processed Legal Document", 0)
+    writer._add_content(expected, CONTENT)
+
+    assert paragraphs(docx.Document(path)) == paragraphs(expected)
+    assert paragraphs(expected)[0] == ("Processed Legal Document", "Title")
+
+
+def test_plain_lines_follow_their_block(writer):
+    """A plain block stays one paragraph; a block with bullets gets one paragraph per line"""
+    content = "First line.\nSecond line.\n\nIntro line.\n• Item one\nClosing line."
+    doc = docx.Document(writer.write_docx(content, "blocks.docx"))
+
+    assert paragraphs(doc)[1:] == [
+        ("First line.\nSecond line.", "Normal"),
+        ("Intro line.", "Normal"),
+        ("Item one", "List Bullet"),
+        ("Closing line.", "Normal"),
+    ]
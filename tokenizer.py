@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from logger_config import get_logger
+
+logger = get_logger(__name__)
+
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """Load the BPE encoding once; returns None if tiktoken is unavailable"""
+    if tiktoken is None:
+        logger.warning("tiktoken not available, falling back to character-based token estimates")
+        return None
+
+    try:
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        # First use downloads the BPE file; offline environments fall back to the heuristic
+        logger.warning("Could not load %s encoding, falling back to character-based token estimates: %s", ENCODING_NAME, e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens in text, approximating with len(text) // 4 without a tokenizer"""
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4
+
+    # encode_ordinary skips the special-token scan; prompts never contain them
+    return len(encoding.encode_ordinary(text))
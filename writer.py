@@ -1,5 +1,6 @@
+import io
 import os
-from typing import Optional
+from typing import Iterable, Optional, Tuple
 from pathlib import Path
 import re
 
@@ -13,6 +14,28 @@ from logger_config import get_logger
 
 logger = get_logger(__name__)
 
+# Line kinds produced by _classify_line
+PARAGRAPH, HEADING, BULLET = 0, 1, 2
+
+# Leading run of '#' marks a heading
+_HEADING_RE = re.compile(r'#+')
+
+# Batch python-docx's many small zip writes into 1 MiB flushes
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Characters not allowed in generated output filenames
+_FILENAME_SAFE_RE = re.compile(r'[^\w\-_.]')
+
+
+def _classify_line(line: str) -> Tuple[int, int]:
+    """Classify a stripped, non-empty line as (kind, heading_level)"""
+    heading = _HEADING_RE.match(line)
+    if heading:
+        return HEADING, min(len(heading.group()), 3)  # Max heading level 3
+    if line[0] in '•-':
+        return BULLET, 0
+    return PARAGRAPH, 0
+
 
 class DocumentWriter:
     """Handles writing processed content to various output formats"""
@@ -27,12 +50,25 @@ class DocumentWriter:
         # Safe directory creation
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
 
+        # Build the invariant part of every output (default template + title)
+        # once; each write_docx loads these bytes instead of rebuilding it
+        self._template_bytes = self._build_template() if Document else None
+
+    def _build_template(self) -> bytes:
+        """Serialize an empty titled document to use as the skeleton for every output"""
+        template = Document()
+        template.add_heading('Processed Legal Document', 0)
+
+        buffer = io.BytesIO()
+        template.save(buffer)
+        return buffer.getvalue()
+
     def write_txt(self, content: str, filename: str) -> str:
         """Write content to a text file"""
         try:
             file_path = os.path.join(self.output_dir, filename)
 
-            with open(file_path, 'w', encoding='utf-8') as file:
+            with open(file_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as file:
                 file.write(content)
 
             logger.info(f"Text file written: {file_path}")
@@ -44,51 +80,25 @@ class DocumentWriter:
 
     def write_docx(self, content: str, filename: str) -> str:
         """Write content to a DOCX file with proper formatting"""
+        return self.write_docx_iter([content], filename)
+
+    def write_docx_iter(self, parts: Iterable[str], filename: str) -> str:
+        """Write content parts to a DOCX file one at a time, without joining them first"""
         try:
             if not Document:
                 raise ImportError("python-docx not available")
 
             file_path = os.path.join(self.output_dir, filename)
 
-            # Create new document
-            doc = Document()
-
-            # Add title
-            doc.add_heading('Processed Legal Document', 0)
-
-            # Process content by sections
-            sections = content.split('\n\n')
-
-            for section in sections:
-                section = section.strip()
-                if not section:
-                    continue
-
-                # Check if it's a heading (starts with # or ##)
-                if section.startswith('#'):
-                    heading_text = section.lstrip('#').strip()
-                    level = min(section.count('#'), 3)  # Max heading level 3
-                    doc.add_heading(heading_text, level)
-
-                # Check if it's a bullet point section
-                elif '•' in section or section.startswith('-'):
-                    lines = section.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith('•') or line.startswith('-'):
-                            # Add as bullet point
-                            p = doc.add_paragraph()
-                            p.style = 'List Bullet'
-                            p.add_run(line.lstrip('•-').strip())
-                        elif line:
-                            # Regular paragraph
-                            doc.add_paragraph(line)
-                else:
-                    # Regular paragraph
-                    doc.add_paragraph(section)
+            # Create new document from the pre-built titled skeleton
+            doc = Document(io.BytesIO(self._template_bytes))
+
+            for part in parts:
+                self._add_content(doc, part)
 
-            # Save document
-            doc.save(file_path)
+            # Save document through a large buffer
+            with open(file_path, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+                doc.save(file)
 
             logger.info(f"DOCX file written: {file_path}")
             return file_path
@@ -97,6 +107,62 @@ class DocumentWriter:
             logger.error(f"Error writing DOCX file {filename}: {str(e)}")
             raise
 
+    def _add_content(self, doc, content: str) -> None:
+        """Append content to the document in a single pass over its lines
+
+        Blocks are separated by blank lines. A plain block stays one paragraph;
+        once a block holds a bullet, each of its plain lines is a paragraph of
+        its own. Headings and bullets are emitted line by line.
+        """
+        paragraph_lines = []
+        bullet_block = False
+
+        def flush_paragraph():
+            if paragraph_lines:
+                doc.add_paragraph('\n'.join(paragraph_lines))
+                paragraph_lines.clear()
+
+        def start_bullet_block():
+            # Plain lines already seen in this block become separate paragraphs
+            nonlocal bullet_block
+            for pending in paragraph_lines:
+                doc.add_paragraph(pending)
+            paragraph_lines.clear()
+            bullet_block = True
+
+        for line in content.splitlines():
+            line = line.strip()
+            if not line:
+                flush_paragraph()
+                bullet_block = False
+                continue
+
+            kind, level = _classify_line(line)
+
+            # Heading (starts with # or ##)
+            if kind == HEADING:
+                flush_paragraph()
+                doc.add_heading(line.lstrip('#').strip(), level)
+
+            # Bullet point
+            elif kind == BULLET:
+                if not bullet_block:
+                    start_bullet_block()
+                p = doc.add_paragraph()
+                p.style = 'List Bullet'
+                p.add_run(line.lstrip('•-').strip())
+
+            # Regular paragraph text
+            else:
+                if not bullet_block and '•' in line:
+                    start_bullet_block()
+                if bullet_block:
+                    doc.add_paragraph(line)
+                else:
+                    paragraph_lines.append(line)
+
+        flush_paragraph()
+
     def write_pdf(self, content: str, filename: str) -> str:
         """Write content to a PDF file (currently fallback to TXT)"""
         try:
@@ -112,16 +178,16 @@ class DocumentWriter:
 
     def create_filename(self, original_name: str, output_type: str, extension: str = "docx") -> str:
         """Create standardized filename for outputs"""
-        base_name = Path(original_name).stem
-        base_name = re.sub(r'[^\w\-_\.]', '_', base_name)
-        return f"{base_name}_{output_type}.{extension}"
+        return f"{_FILENAME_SAFE_RE.sub('_', Path(original_name).stem)}_{output_type}.{extension}"
 
     def cleanup_temp_files(self, file_paths: list) -> None:
         """Remove temporary files after processing"""
         for file_path in file_paths:
+            # Unlink directly: one syscall, and a missing file is not an error
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.debug(f"Cleaned up temp file: {file_path}")
-            except Exception as e:
+                os.unlink(file_path)
+                logger.debug(f"Cleaned up temp file: {file_path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
                 logger.warning(f"Could not remove temp file {file_path}: {str(e)}")